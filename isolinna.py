@@ -1,13 +1,22 @@
 import os
+import sys
+import csv
+import gzip
 import json
+import math
 import uuid
 import pyrebase
 import time
+import queue
 import threading
 import subprocess
+import asyncio
+import operator
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from rich.console import Console
-from rich.prompt import Prompt, IntPrompt
+from rich.prompt import Prompt, IntPrompt, Confirm
 from rich.panel import Panel
 from rich import box
 from rich.table import Table
@@ -18,18 +27,68 @@ from rich import print
 from rich.markup import escape
 import logging
 
+# Use the asyncio engine instead of the threaded one?
+ASYNCIO_ENGINE = "--asyncio" in sys.argv
+
 # NOTE: This must be set before importing ruuvitag_sensor.
-os.environ["RUUVI_BLE_ADAPTER"] = "bluez"
+# The asynchronous data retrieval requires the Bleak adapter.
+os.environ["RUUVI_BLE_ADAPTER"] = "bleak" if ASYNCIO_ENGINE else "bluez"
+
+if ASYNCIO_ENGINE:
+    try:
+        import bleak
+    except ImportError:
+        print("[bold red]asyncio engine requires bleak. Please install it with pip.")
+        exit(1)
 
 from ruuvitag_sensor.ruuvi import RuuviTagSensor, RunFlag
 
+# Parquet export is optional
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# MQTT sink is optional
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+# asyncio engine is optional
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
 # Turn off the warnings because of ruuvitag_sensor
 logging.basicConfig(level=logging.ERROR)
 
 # Global Constants
 SETTINGS_PATH = 'settings.json'
 FIREBASE_CONF_PATH = 'isolinna.json'
+READINGS_PATH = 'readings.jsonl'
+READINGS_MAX_SIZE = 50000000    # Bytes before readings.jsonl is rotated to readings.jsonl.1
+RULES_PATH = 'rules.json'
 TOKEN_UPDATE_DURATION = 1800    # 1800 seconds = 30 minutes
+EXPORT_CHUNK_SIZE = 10000       # Readings per CSV/Parquet write
+EXPORT_FIELDS = ['utc_timestamp', 'mac', 'temperature', 'humidity', 'pressure', 'rssi', 'battery']
+RULE_OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+RULE_AGGREGATES = ['last', 'avg', 'min', 'max']
+RULE_FIELDS = ['temperature', 'humidity', 'pressure', 'rssi', 'battery']
+SINK_NAMES = ['firebase', 'readings_file', 'mqtt', 'line_protocol']
+SINK_QUEUE_SIZE = 1000          # Items queued per sink before dropping
+TOKEN_CHECK_INTERVAL = 60       # Seconds between token expiration checks (asyncio engine)
+UPLOAD_RETRIES = 3              # Retries of a failed upload request (asyncio engine)
+UPLOAD_RETRY_DELAY = 1          # Seconds before the first retry, doubled on each retry
+ADAPTIVE_FIELDS = ['temperature', 'humidity', 'pressure', 'rssi', 'battery']
+ADAPTIVE_TIME_CONSTANT = 300    # Seconds of smoothing of the trends
+ADAPTIVE_CHANGE_SCALES = {'temperature': 0.1, 'humidity': 0.5, 'pressure': 0.1}  # Significant change per minute
+ADAPTIVE_RSSI_SLOPE = 1         # Significant RSSI drop (dBm) per minute
+ADAPTIVE_RSSI_WEAK = -85        # Weak signal (dBm)
+ADAPTIVE_BATTERY_SLOPE = 50     # Significant battery drop (mV) per hour
+ADAPTIVE_BATTERY_LOW = 2500     # Low battery (mV)
 
 settings = {}
 
@@ -41,6 +100,7 @@ db = None
 discovered_sensors = []
 run_flag = RunFlag()
 time_stamps = {}
+rules = []
 
 console = Console()
 
@@ -72,6 +132,796 @@ def ui_commands(commands_strings: list, commands: list):
     else:
         commands[command - 1]()
 
+#-----------------------------------------------------------------------------#
+# ui_recent_events - Prints the table of the recently sent readings           #
+#-----------------------------------------------------------------------------#
+def ui_recent_events(data_history: list):
+    table = Table(title="Recent Events", width=80, box=box.ROUNDED, style="green", title_style="bold green")
+
+    table.add_column("Time", justify="center", style="yellow", header_style="bold yellow")
+    table.add_column("Sensor", justify="center", style="cyan", header_style="bold cyan")
+    table.add_column("Data", justify="center", style="white", header_style="bold white")
+
+    for data in data_history:
+        data_str = f"Temperature: {data['data']['temperature']} \u00B0C, Humidity: {data['data']['humidity']} %, Pressure: {data['data']['pressure']} hPa, RSSI: {data['data']['rssi']} dBm, Battery: {(data['data']['battery']) / 1000} V"
+        table.add_row(Text(datetime.strptime(data['timestamp'], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S")), Text(data['mac']), Text(data_str))
+
+    print(table)
+
+#-----------------------------------------------------------------------------#
+# ui_sink_problems - Prints the dropped and failed items of the sinks         #
+#-----------------------------------------------------------------------------#
+def ui_sink_problems(dropped: dict, errors: dict):
+    problems = [
+        f"{name}: {dropped.get(name, 0)} dropped, {errors.get(name, 0)} failed"
+        for name in dropped
+        if dropped.get(name, 0) > 0 or errors.get(name, 0) > 0
+    ]
+
+    if problems:
+        console.print(Panel(Text("\n".join(problems), style="bold red"), title="[bold red]Output Problems", style="red", width=80))
+
+#-----------------------------------------------------------------------------#
+#                               EXPORT RELATED                                #
+#-----------------------------------------------------------------------------#
+
+#-----------------------------------------------------------------------------#
+# record_reading - Appends a reading to the local readings file               #
+#-----------------------------------------------------------------------------#
+def record_reading(readings_file, reading: dict) -> int:
+    return readings_file.write(json.dumps(reading, separators=(',', ':')) + "\n")
+
+#-----------------------------------------------------------------------------#
+# read_readings - Yields the local readings matching the filters one by one   #
+#-----------------------------------------------------------------------------#
+def read_readings(paths: list, macs: list = None, start: str = None, end: str = None):
+    # NOTE: Timestamps are fixed-format UTC strings ("%Y-%m-%dT%H:%M:%SZ"), so
+    # they can be compared as strings without parsing.
+    for path in paths:
+        with open(path, 'r') as f:
+            for line in f:
+                # Skip lines of other sensors without parsing the JSON
+                if macs and not any(mac in line for mac in macs):
+                    continue
+
+                try:
+                    reading = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                if macs and reading['mac'] not in macs:
+                    continue
+                if start is not None and reading['utc_timestamp'] < start:
+                    continue
+                if end is not None and reading['utc_timestamp'] > end:
+                    continue
+
+                yield reading
+
+#-----------------------------------------------------------------------------#
+# chunked - Groups an iterable into lists of a given size                     #
+#-----------------------------------------------------------------------------#
+def chunked(iterable, size: int):
+    chunk = []
+
+    for item in iterable:
+        chunk.append(item)
+
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+#-----------------------------------------------------------------------------#
+# export_csv - Streams readings to a (gzip compressed) CSV file               #
+#-----------------------------------------------------------------------------#
+def export_csv(readings, path: str, compress: bool = False) -> int:
+    count = 0
+
+    if compress:
+        f = gzip.open(path, 'wt', newline='')
+    else:
+        f = open(path, 'w', newline='')
+
+    with f:
+        writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+
+        for chunk in chunked(readings, EXPORT_CHUNK_SIZE):
+            writer.writerows(chunk)
+            count += len(chunk)
+
+    return count
+
+#-----------------------------------------------------------------------------#
+# export_parquet - Streams readings to a (zstd compressed) Parquet file       #
+#-----------------------------------------------------------------------------#
+def export_parquet(readings, path: str, compress: bool = False) -> int:
+    count = 0
+
+    schema = pyarrow.schema([
+        ('utc_timestamp', pyarrow.string()),
+        ('mac', pyarrow.string()),
+        ('temperature', pyarrow.float64()),
+        ('humidity', pyarrow.float64()),
+        ('pressure', pyarrow.float64()),
+        ('rssi', pyarrow.int64()),
+        ('battery', pyarrow.int64())
+    ])
+
+    # Each chunk becomes its own row group, so only one chunk is held in memory
+    with pyarrow.parquet.ParquetWriter(path, schema, compression='zstd' if compress else 'none') as writer:
+        for chunk in chunked(readings, EXPORT_CHUNK_SIZE):
+            writer.write_table(pyarrow.Table.from_pylist(chunk, schema=schema))
+            count += len(chunk)
+
+    return count
+
+#-----------------------------------------------------------------------------#
+#                                RULES RELATED                                #
+#-----------------------------------------------------------------------------#
+
+#-----------------------------------------------------------------------------#
+# SlidingWindow - Incrementally maintained aggregates over a time window      #
+#-----------------------------------------------------------------------------#
+class SlidingWindow:
+    def __init__(self, duration: float):
+        self.duration = duration
+        self.samples = deque()      # (sequence number, time, value)
+        self.minimums = deque()     # Monotonic increasing values
+        self.maximums = deque()     # Monotonic decreasing values
+        self.total = 0.0
+        self.start = None           # Time of the first sample of an unbroken run
+        self.sequence = 0           # Identifies samples with equal times and values
+
+    # add - Adds a sample and drops the samples that fell out of the window ---
+    def add(self, t: float, value: float):
+        # Drop samples that are older than the window
+        while self.samples and self.samples[0][1] <= t - self.duration:
+            old_sequence, _, old_value = self.samples.popleft()
+            self.total -= old_value
+
+            if self.minimums and self.minimums[0][0] == old_sequence:
+                self.minimums.popleft()
+            if self.maximums and self.maximums[0][0] == old_sequence:
+                self.maximums.popleft()
+
+        # The window was empty, so the run starts again
+        if not self.samples:
+            self.start = t
+            self.total = 0.0
+
+        self.sequence += 1
+        sample = (self.sequence, t, value)
+
+        self.samples.append(sample)
+        self.total += value
+
+        while self.minimums and self.minimums[-1][2] >= value:
+            self.minimums.pop()
+        self.minimums.append(sample)
+
+        while self.maximums and self.maximums[-1][2] <= value:
+            self.maximums.pop()
+        self.maximums.append(sample)
+
+    # ready - Does the window hold an unbroken run of its whole duration? -----
+    def ready(self, t: float) -> bool:
+        return self.start is not None and (t - self.start) >= self.duration
+
+    # aggregate - Returns the aggregate of the samples in the window ----------
+    def aggregate(self, name: str) -> float:
+        if name == 'avg':
+            return self.total / len(self.samples)
+        elif name == 'min':
+            return self.minimums[0][2]
+        elif name == 'max':
+            return self.maximums[0][2]
+        else:
+            return self.samples[-1][2]
+
+#-----------------------------------------------------------------------------#
+# RuleEngine - Evaluates the threshold rules against the readings             #
+#-----------------------------------------------------------------------------#
+class RuleEngine:
+    def __init__(self, rules: list):
+        self.rules = rules
+        self.mac_rules = {}     # MAC -> [(rule index, rule)] applying to it
+        self.windows = {}       # MAC -> {(field, window): SlidingWindow}
+        self.fired = set()      # (rule index, MAC) of the fired rules
+
+    # rules_for - Returns the rules applying to a MAC (cached) ----------------
+    def rules_for(self, mac_address: str) -> list:
+        if mac_address not in self.mac_rules:
+            self.mac_rules[mac_address] = [
+                (index, rule) for index, rule in enumerate(self.rules)
+                if rule.get('mac') is None or rule['mac'].upper() == mac_address
+            ]
+            # Rules with the same field and window share one SlidingWindow
+            self.windows[mac_address] = {
+                (rule['field'], rule.get('window', 0)): SlidingWindow(rule.get('window', 0))
+                for _, rule in self.mac_rules[mac_address]
+            }
+
+        return self.mac_rules[mac_address]
+
+    # evaluate - Evaluates a reading and returns the rule transitions ---------
+    def evaluate(self, mac_address: str, sensor_data: dict, t: float) -> list:
+        transitions = []
+        mac_rules = self.rules_for(mac_address)
+        windows = self.windows[mac_address]
+
+        # Update each window once
+        for (field, _), window in windows.items():
+            if sensor_data.get(field) is not None:
+                window.add(t, sensor_data[field])
+
+        # Evaluate the rules
+        for index, rule in mac_rules:
+            window = windows[(rule['field'], rule.get('window', 0))]
+
+            if not window.samples or not window.ready(t):
+                continue
+
+            value = window.aggregate(rule.get('aggregate', 'last'))
+            was_active = (index, mac_address) in self.fired
+
+            # A fired rule clears only past the clear threshold (hysteresis)
+            if was_active:
+                active = RULE_OPERATORS[rule['operator']](value, rule.get('clear_threshold', rule['threshold']))
+            else:
+                active = RULE_OPERATORS[rule['operator']](value, rule['threshold'])
+
+            if active and not was_active:
+                self.fired.add((index, mac_address))
+                transitions.append({'rule': rule['name'], 'state': 'fired', 'value': value})
+            elif not active and was_active:
+                self.fired.discard((index, mac_address))
+                transitions.append({'rule': rule['name'], 'state': 'cleared', 'value': value})
+
+        return transitions
+
+#-----------------------------------------------------------------------------#
+# validate_rule - Returns an error message for an invalid rule or None        #
+#-----------------------------------------------------------------------------#
+def validate_rule(rule) -> str:
+    if not isinstance(rule, dict):
+        return "Rule must be an object"
+
+    for key in ['name', 'field', 'operator', 'threshold']:
+        if key not in rule:
+            return f"Rule is missing a required key: '{key}'"
+
+    if rule['field'] not in RULE_FIELDS:
+        return f"Rule '{rule['name']}' has an invalid field: '{rule['field']}'"
+
+    if not isinstance(rule['threshold'], (int, float)) or isinstance(rule['threshold'], bool):
+        return f"Rule '{rule['name']}' has an invalid threshold: '{rule['threshold']}'"
+
+    if rule.get('mac') is not None and not isinstance(rule['mac'], str):
+        return f"Rule '{rule['name']}' has an invalid MAC address: '{rule['mac']}'"
+
+    if rule['operator'] not in RULE_OPERATORS:
+        return f"Rule '{rule['name']}' has an invalid operator: '{rule['operator']}'"
+
+    if rule.get('aggregate', 'last') not in RULE_AGGREGATES:
+        return f"Rule '{rule['name']}' has an invalid aggregate: '{rule['aggregate']}'"
+
+    if not isinstance(rule.get('window', 0), (int, float)) or isinstance(rule.get('window', 0), bool) or rule.get('window', 0) < 0:
+        return f"Rule '{rule['name']}' has an invalid window: '{rule['window']}'"
+
+    if 'clear_threshold' in rule:
+        if not isinstance(rule['clear_threshold'], (int, float)) or isinstance(rule['clear_threshold'], bool):
+            return f"Rule '{rule['name']}' has an invalid clear threshold: '{rule['clear_threshold']}'"
+
+        # The clear threshold must be on the non-firing side of the threshold
+        if rule['operator'] in ['>', '>='] and rule['clear_threshold'] > rule['threshold']:
+            return f"Rule '{rule['name']}' must have a clear threshold below or equal to its threshold"
+        if rule['operator'] in ['<', '<='] and rule['clear_threshold'] < rule['threshold']:
+            return f"Rule '{rule['name']}' must have a clear threshold above or equal to its threshold"
+
+    return None
+
+#-----------------------------------------------------------------------------#
+#                                SINKS RELATED                                #
+#-----------------------------------------------------------------------------#
+
+#-----------------------------------------------------------------------------#
+# Sink - Base class for the output sinks                                      #
+#-----------------------------------------------------------------------------#
+class Sink:
+    name = "sink"
+
+    # send_reading - Sends a reading ------------------------------------------
+    def send_reading(self, reading: dict):
+        pass
+
+    # send_alert - Sends a rule transition ------------------------------------
+    def send_alert(self, alert: dict):
+        pass
+
+    # flush - Called when the sink's queue has been emptied -------------------
+    def flush(self):
+        pass
+
+    # close - Releases the sink's resources -----------------------------------
+    def close(self):
+        pass
+
+#-----------------------------------------------------------------------------#
+# FirebaseSink - Sends the readings and alerts to Firebase                    #
+#-----------------------------------------------------------------------------#
+class FirebaseSink(Sink):
+    name = "firebase"
+
+    def send_reading(self, reading: dict):
+        values = {key: value for key, value in reading.items() if key != 'mac'}
+        device = db.child("users").child(settings['user_uid']).child("devices").child(settings['device_uuid'])
+
+        device.child(reading['mac']).push(values, settings['id_token'])
+        device.child("new_values").child(reading['mac']).update(values, settings['id_token'])
+
+    def send_alert(self, alert: dict):
+        values = {key: value for key, value in alert.items() if key != 'mac'}
+        device = db.child("users").child(settings['user_uid']).child("devices").child(settings['device_uuid'])
+
+        device.child("alerts").child(alert['mac']).push(values, settings['id_token'])
+
+#-----------------------------------------------------------------------------#
+# ReadingsFileSink - Appends the readings to the local readings file          #
+#-----------------------------------------------------------------------------#
+class ReadingsFileSink(Sink):
+    name = "readings_file"
+
+    def __init__(self, path: str, max_size: int = READINGS_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.file = open(path, 'a')
+        self.size = self.file.tell()
+
+    def send_reading(self, reading: dict):
+        self.size += record_reading(self.file, reading)
+
+        # Keep only the current and the previous file
+        if self.size >= self.max_size:
+            self.file.close()
+            os.replace(self.path, self.path + ".1")
+            self.file = open(self.path, 'a')
+            self.size = 0
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+#-----------------------------------------------------------------------------#
+# MqttSink - Publishes the readings and alerts to an MQTT broker              #
+#-----------------------------------------------------------------------------#
+class MqttSink(Sink):
+    name = "mqtt"
+
+    def __init__(self, host: str, port: int, topic: str):
+        self.topic = topic
+
+        # paho-mqtt 2.x requires the callback API version
+        if hasattr(mqtt, 'CallbackAPIVersion'):
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        else:
+            self.client = mqtt.Client()
+
+        self.client.connect(host, port)
+        self.client.loop_start()
+
+    def send_reading(self, reading: dict):
+        self.client.publish(f"{self.topic}/readings/{reading['mac']}", json.dumps(reading))
+
+    def send_alert(self, alert: dict):
+        self.client.publish(f"{self.topic}/alerts/{alert['mac']}", json.dumps(alert))
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+#-----------------------------------------------------------------------------#
+# LineProtocolSink - Appends the readings to an InfluxDB line protocol file   #
+#-----------------------------------------------------------------------------#
+class LineProtocolSink(Sink):
+    name = "line_protocol"
+
+    def __init__(self, path: str):
+        self.file = open(path, 'a')
+
+    def send_reading(self, reading: dict):
+        timestamp = int(datetime.strptime(reading['utc_timestamp'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp())
+
+        fields = [f"{key}={reading[key]}" for key in ['temperature', 'humidity', 'pressure'] if reading[key] is not None]
+        fields += [f"{key}={reading[key]}i" for key in ['rssi', 'battery'] if reading[key] is not None]
+
+        if fields:
+            self.file.write(f"ruuvi,mac={reading['mac']} {','.join(fields)} {timestamp * 1000000000}\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+#-----------------------------------------------------------------------------#
+# MemorySink - Keeps the readings and alerts in memory (for testing)          #
+#-----------------------------------------------------------------------------#
+class MemorySink(Sink):
+    name = "memory"
+
+    def __init__(self):
+        self.readings = []
+        self.alerts = []
+
+    def send_reading(self, reading: dict):
+        self.readings.append(reading)
+
+    def send_alert(self, alert: dict):
+        self.alerts.append(alert)
+
+#-----------------------------------------------------------------------------#
+# FanOut - Delivers the readings and alerts to the sinks concurrently         #
+#-----------------------------------------------------------------------------#
+class FanOut:
+    def __init__(self, sinks: list, queue_size: int = SINK_QUEUE_SIZE):
+        self.sinks = sinks
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in sinks]
+        self.dropped = {sink.name: 0 for sink in sinks}
+        self.errors = {sink.name: 0 for sink in sinks}
+        self.threads = [
+            threading.Thread(target=self.worker, args=(sink, sink_queue), daemon=True)
+            for sink, sink_queue in zip(sinks, self.queues)
+        ]
+
+        for thread in self.threads:
+            thread.start()
+
+    # worker - Delivers the queued items to a single sink ---------------------
+    def worker(self, sink: Sink, sink_queue: queue.Queue):
+        while True:
+            item = sink_queue.get()
+
+            # None tells the worker to stop
+            if item is None:
+                break
+
+            kind, payload = item
+
+            try:
+                if kind == 'reading':
+                    sink.send_reading(payload)
+                else:
+                    sink.send_alert(payload)
+
+                if sink_queue.empty():
+                    sink.flush()
+            except Exception as e:
+                self.errors[sink.name] += 1
+                logging.error(f"{sink.name}: Could not send {kind}: {e}")
+
+        try:
+            sink.flush()
+            sink.close()
+        except Exception as e:
+            self.errors[sink.name] += 1
+            logging.error(f"{sink.name}: Could not close sink: {e}")
+
+    # publish - Queues an item for every sink without blocking ----------------
+    def publish(self, kind: str, payload: dict):
+        for sink, sink_queue in zip(self.sinks, self.queues):
+            try:
+                sink_queue.put_nowait((kind, payload))
+            except queue.Full:
+                # The sink is too slow, so drop the item for that sink only
+                if self.dropped[sink.name] == 0:
+                    logging.error(f"{sink.name}: Queue is full, dropping items")
+                self.dropped[sink.name] += 1
+
+    # close - Stops the workers after the queued items have been delivered ----
+    def close(self, timeout: float = None):
+        # Signal the workers without blocking. If a stuck sink's queue is
+        # full, its oldest items are dropped to make room for the signal.
+        for sink, sink_queue in zip(self.sinks, self.queues):
+            while True:
+                try:
+                    sink_queue.put_nowait(None)
+                    break
+                except queue.Full:
+                    try:
+                        sink_queue.get_nowait()
+                        self.dropped[sink.name] += 1
+                    except queue.Empty:
+                        pass
+
+        # Wait for the workers, but no longer than the timeout in total
+        deadline = None if timeout is None else time.time() + timeout
+
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.time()))
+
+#-----------------------------------------------------------------------------#
+# create_sinks - Creates the sinks enabled in the settings                    #
+#-----------------------------------------------------------------------------#
+def create_sinks() -> list:
+    global settings, READINGS_PATH
+    sinks = []
+
+    if 'firebase' in settings['sinks']:
+        sinks.append(FirebaseSink())
+
+    # Keep a local copy of the readings for exporting
+    if 'readings_file' in settings['sinks']:
+        try:
+            sinks.append(ReadingsFileSink(READINGS_PATH))
+        except IOError:
+            print(f"[bold red]{READINGS_PATH}: Could not open file. Please check if you have write permissions.")
+            exit(1)
+
+    if 'mqtt' in settings['sinks']:
+        if mqtt is None:
+            print("[bold red]MQTT sink requires paho-mqtt. Please install it with pip.")
+            exit(1)
+
+        try:
+            sinks.append(MqttSink(settings['mqtt_host'], settings['mqtt_port'], settings['mqtt_topic']))
+        except OSError as e:
+            print(f"[bold red]Could not connect to the MQTT broker: {e}")
+            exit(1)
+
+    if 'line_protocol' in settings['sinks']:
+        try:
+            sinks.append(LineProtocolSink(settings['line_protocol_path']))
+        except IOError:
+            print(f"[bold red]{settings['line_protocol_path']}: Could not open file. Please check if you have write permissions.")
+            exit(1)
+
+    return sinks
+
+#-----------------------------------------------------------------------------#
+#                              SAMPLING RELATED                               #
+#-----------------------------------------------------------------------------#
+
+#-----------------------------------------------------------------------------#
+# AdaptiveSampler - Adapts the upload interval of each sensor to its trends   #
+#-----------------------------------------------------------------------------#
+class AdaptiveSampler:
+    def __init__(self, min_interval: float, max_interval: float, budget: float):
+        self.min_interval = min_interval    # Seconds
+        self.max_interval = max_interval    # Seconds
+        self.budget = budget                # Uploads per hour of all sensors
+        self.sensors = {}                   # MAC -> state
+        self.total_rate = 0.0               # Uploads per hour of all sensors
+        self.last_prune = None
+
+    # observe - Updates the trends and the interval of a sensor ---------------
+    def observe(self, mac_address: str, sensor_data: dict, t: float):
+        state = self.sensors.get(mac_address)
+
+        if state is None:
+            # New sensors start at the highest rate until trends are known
+            state = {'first_time': t, 'time': t, 'levels': {}, 'slopes': {}, 'rate': 3600 / self.min_interval}
+            self.sensors[mac_address] = state
+            self.total_rate += state['rate']
+
+        dt = t - state['time']
+        state['time'] = t
+
+        # Exponentially weighted levels and slopes (per second) of the fields
+        alpha = 1 - math.exp(-dt / ADAPTIVE_TIME_CONSTANT) if dt > 0 else 0.0
+
+        for field in ADAPTIVE_FIELDS:
+            value = sensor_data.get(field)
+
+            if value is None:
+                continue
+
+            if field not in state['levels']:
+                state['levels'][field] = value
+                state['slopes'][field] = 0.0
+            elif dt > 0:
+                level = state['levels'][field]
+                new_level = level + alpha * (value - level)
+                state['levels'][field] = new_level
+                state['slopes'][field] += alpha * ((new_level - level) / dt - state['slopes'][field])
+
+        # Update the sensor's rate and the fleet's total rate
+        if (t - state['first_time']) < ADAPTIVE_TIME_CONSTANT:
+            rate = 3600 / self.min_interval
+        else:
+            rate = 3600 / self.base_interval(state)
+        self.total_rate += rate - state['rate']
+        state['rate'] = rate
+
+        self.prune(t)
+
+    # base_interval - Returns the interval of a sensor before the budget ------
+    def base_interval(self, state: dict) -> float:
+        levels = state['levels']
+        slopes = state['slopes']
+
+        # Quickly changing environment
+        score = max(
+            [abs(slopes[field]) * 60 / scale for field, scale in ADAPTIVE_CHANGE_SCALES.items() if field in slopes],
+            default=0.0
+        )
+
+        # Fading or weak signal
+        if 'rssi' in levels:
+            score += max(0.0, -slopes['rssi'] * 60 / ADAPTIVE_RSSI_SLOPE)
+            score += max(0.0, (ADAPTIVE_RSSI_WEAK - levels['rssi']) / 10)
+
+        # Draining or low battery
+        if 'battery' in levels:
+            score += max(0.0, -slopes['battery'] * 3600 / ADAPTIVE_BATTERY_SLOPE)
+            score += max(0.0, (ADAPTIVE_BATTERY_LOW - levels['battery']) / 200)
+
+        # Map the score from [0, inf) to the interval bounds
+        urgency = score / (1 + score)
+
+        return self.max_interval - urgency * (self.max_interval - self.min_interval)
+
+    # prune - Forgets the sensors that have not been seen for a while ---------
+    def prune(self, t: float):
+        if self.last_prune is not None and (t - self.last_prune) < self.max_interval:
+            return
+
+        self.last_prune = t
+
+        for mac_address in [mac for mac, state in self.sensors.items() if (t - state['time']) > 2 * self.max_interval]:
+            self.total_rate -= self.sensors.pop(mac_address)['rate']
+
+    # interval - Returns the upload interval of a sensor in seconds -----------
+    def interval(self, mac_address: str) -> float:
+        state = self.sensors[mac_address]
+
+        # Stretch all intervals evenly if the fleet exceeds the budget
+        return (3600 / state['rate']) * max(1.0, self.total_rate / self.budget)
+
+#-----------------------------------------------------------------------------#
+# create_sampler - Creates the adaptive sampler if enabled in the settings    #
+#-----------------------------------------------------------------------------#
+def create_sampler() -> AdaptiveSampler:
+    global settings
+
+    if not settings['adaptive_sampling']:
+        return None
+
+    return AdaptiveSampler(
+        settings['adaptive_min_interval'] * 60,
+        settings['adaptive_max_interval'] * 60,
+        settings['upload_budget']
+    )
+
+#-----------------------------------------------------------------------------#
+#                            BROADCASTING RELATED                             #
+#-----------------------------------------------------------------------------#
+
+#-----------------------------------------------------------------------------#
+# process_reading - Evaluates the rules and publishes the reading when due.   #
+#                   Returns True if the reading was published.                #
+#-----------------------------------------------------------------------------#
+def process_reading(mac_address: str, sensor_data: dict, current_time: float, rule_engine: RuleEngine, sampler: AdaptiveSampler, data_history: list, publish) -> bool:
+    global settings, time_stamps
+
+    # Evaluate the rules against every reading and send only the transitions
+    for transition in rule_engine.evaluate(mac_address, sensor_data, current_time):
+        publish('alert', {
+            'utc_timestamp': datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            'mac': mac_address,
+            'rule': transition['rule'],
+            'state': transition['state'],
+            'value': transition['value']
+        })
+
+    # Upload interval of the sensor
+    if sampler is not None:
+        sampler.observe(mac_address, sensor_data, current_time)
+        interval = sampler.interval(mac_address)
+    else:
+        interval = settings['time_interval'] * 60
+
+    if time_stamps.get(mac_address) is not None and (current_time - time_stamps[mac_address]) < interval:
+        return False
+
+    time_stamps[mac_address] = current_time
+    if len(data_history) == 10:
+        data_history.pop(0)
+
+    utc_timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    entry = {"timestamp": utc_timestamp, "mac": mac_address, "data": sensor_data}
+    data_history.append(entry)
+
+    publish('reading', {
+        'utc_timestamp': utc_timestamp,
+        'mac': mac_address,
+        'temperature': sensor_data['temperature'],
+        'humidity': sensor_data['humidity'],
+        'pressure': sensor_data['pressure'],
+        'rssi': sensor_data['rssi'],
+        'battery': sensor_data['battery']
+    })
+
+    return True
+
+#-----------------------------------------------------------------------------#
+#                           ASYNCIO ENGINE RELATED                            #
+#-----------------------------------------------------------------------------#
+
+#-----------------------------------------------------------------------------#
+# firebase_request - Sends a request to the Firebase Realtime Database        #
+#-----------------------------------------------------------------------------#
+async def firebase_request(session, method: str, path: str, values: dict):
+    global firebaseConfig, settings
+
+    url = f"{firebaseConfig['databaseURL'].rstrip('/')}/{path}.json"
+
+    async with session.request(method, url, params={'auth': settings['id_token']}, json=values) as response:
+        response.raise_for_status()
+
+#-----------------------------------------------------------------------------#
+# firebase_request_with_retry - Sends a request and retries it on a network  #
+#                               error, an expired token (401) or a server     #
+#                               error (5xx) with an exponential backoff       #
+#-----------------------------------------------------------------------------#
+async def firebase_request_with_retry(session, method: str, path: str, values: dict, refresh_token):
+    for attempt in range(UPLOAD_RETRIES + 1):
+        try:
+            await firebase_request(session, method, path, values)
+            return
+        except aiohttp.ClientResponseError as e:
+            if attempt == UPLOAD_RETRIES or (e.status != 401 and e.status < 500):
+                raise
+
+            # The token has expired before the token timer noticed it
+            if e.status == 401:
+                await refresh_token(session)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == UPLOAD_RETRIES:
+                raise
+
+        await asyncio.sleep(UPLOAD_RETRY_DELAY * 2 ** attempt)
+
+#-----------------------------------------------------------------------------#
+# firebase_upload - Uploads a reading or an alert to Firebase                 #
+#-----------------------------------------------------------------------------#
+async def firebase_upload(session, kind: str, payload: dict, refresh_token):
+    global settings
+
+    values = {key: value for key, value in payload.items() if key != 'mac'}
+    device_path = f"users/{settings['user_uid']}/devices/{settings['device_uuid']}"
+
+    # POST is the REST equivalent of push() and PATCH of update(). The
+    # requests are sent one after another, so each upload worker has at most
+    # one request in flight.
+    if kind == 'reading':
+        await firebase_request_with_retry(session, 'POST', f"{device_path}/{payload['mac']}", values, refresh_token)
+        await firebase_request_with_retry(session, 'PATCH', f"{device_path}/new_values/{payload['mac']}", values, refresh_token)
+    else:
+        await firebase_request_with_retry(session, 'POST', f"{device_path}/alerts/{payload['mac']}", values, refresh_token)
+
+#-----------------------------------------------------------------------------#
+# refresh_user_token_async - Refreshes the user's token                       #
+#-----------------------------------------------------------------------------#
+async def refresh_user_token_async(session):
+    global firebaseConfig, settings
+
+    url = "https://securetoken.googleapis.com/v1/token"
+    data = {'grant_type': 'refresh_token', 'refresh_token': settings['refresh_token']}
+
+    async with session.post(url, params={'key': firebaseConfig['apiKey']}, data=data) as response:
+        response.raise_for_status()
+        tokens = await response.json()
+
+    settings['id_token'] = tokens['id_token']
+    settings['refresh_token'] = tokens['refresh_token']
+    settings['token_expiration_time'] = int(time.time()) + int(tokens['expires_in'])
+
 #-----------------------------------------------------------------------------#
 #                                   SCREENS                                   #
 #-----------------------------------------------------------------------------#
@@ -80,9 +930,12 @@ def ui_commands(commands_strings: list, commands: list):
 # broadcasting_screen - Broadcasting Screen                                   #
 #-----------------------------------------------------------------------------#
 def broadcasting_screen():
-    global settings, SETTINGS_PATH, run_flag
+    global settings, SETTINGS_PATH, run_flag, rules
     finished = False
     data_history = []
+    rule_engine = RuleEngine(rules)
+    sampler = create_sampler()
+    fan_out = None
 
     if not settings['broadcasting']:
         settings['broadcasting'] = True
@@ -121,6 +974,10 @@ def broadcasting_screen():
 
         mac_address, sensor_data = found_data
 
+        # Broadcasting has been stopped
+        if finished:
+            return
+
         if sensor_data['data_format'] < 5:
             return
         
@@ -130,56 +987,15 @@ def broadcasting_screen():
         if (settings['token_expiration_time'] - int(current_time)) <= TOKEN_UPDATE_DURATION:
             refresh_user_token()
 
-        if time_stamps.get(mac_address) is None or (current_time - time_stamps[mac_address]) >= settings['time_interval'] * 60:
-            time_stamps[mac_address] = current_time
-            if len(data_history) == 10:
-                data_history.pop(0)
-
-            utc_timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-            entry = {"timestamp": utc_timestamp, "mac": mac_address, "data": sensor_data}
-            data_history.append(entry)
-
-            db.child("users").child(settings['user_uid']).child("devices").child(settings['device_uuid']).child(mac_address).push(
-                {
-                    'utc_timestamp': utc_timestamp,
-                    'temperature': sensor_data['temperature'], 
-                    'humidity': sensor_data['humidity'], 
-                    'pressure': sensor_data['pressure'], 
-                    'rssi': sensor_data['rssi'],
-                    'battery': sensor_data['battery']
-                }, 
-                settings['id_token']
-            )
-
-            db.child("users").child(settings['user_uid']).child("devices").child(settings['device_uuid']).child("new_values").child(mac_address).update(
-                {
-                    'utc_timestamp': utc_timestamp,
-                    'temperature': sensor_data['temperature'], 
-                    'humidity': sensor_data['humidity'], 
-                    'pressure': sensor_data['pressure'], 
-                    'rssi': sensor_data['rssi'],
-                    'battery': sensor_data['battery']
-                }, 
-                settings['id_token']
-            )
-            
+        if process_reading(mac_address, sensor_data, current_time, rule_engine, sampler, data_history, fan_out.publish):
             subprocess.call(['tput', 'reset'])
             # console.clear()
             ui_title("Broadcasting...")
             console.print()
 
             # Print table
-            table = Table(title="Recent Events", width=80, box=box.ROUNDED, style="green", title_style="bold green")
-
-            table.add_column("Time", justify="center", style="yellow", header_style="bold yellow")
-            table.add_column("Sensor", justify="center", style="cyan", header_style="bold cyan")
-            table.add_column("Data", justify="center", style="white", header_style="bold white")
-
-            for data in data_history:
-                data_str = f"Temperature: {data['data']['temperature']} \u00B0C, Humidity: {data['data']['humidity']} %, Pressure: {data['data']['pressure']} hPa, RSSI: {data['data']['rssi']} dBm, Battery: {(data['data']['battery']) / 1000} V"
-                table.add_row(Text(datetime.strptime(data['timestamp'], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S")), Text(data['mac']), Text(data_str))
-
-            print(table)
+            ui_recent_events(data_history)
+            ui_sink_problems(fan_out.dropped, fan_out.errors)
 
             # List of commands
             commands_strings = ["Stop broadcasting"]
@@ -201,6 +1017,9 @@ def broadcasting_screen():
             RuuviTagSensor.get_data(send_sensors, settings['followed_sensors'], run_flag)
     #--------------------------------------------------------------------------
 
+    # Start the output sinks
+    fan_out = FanOut(create_sinks())
+
     run_flag.running = True
     thread = threading.Thread(target=send_sensors_thread)
     thread.start()
@@ -214,6 +1033,9 @@ def broadcasting_screen():
         run_flag.running = False
         settings['broadcasting'] = False
 
+        # Deliver the queued readings before leaving
+        fan_out.close(timeout=10)
+
         try:
             with open(SETTINGS_PATH, 'w') as f:
                 json.dump(settings, f, indent=4)
@@ -229,17 +1051,8 @@ def broadcasting_screen():
         ui_title("Broadcasting...")
 
         # Print table
-        table = Table(title="Recent Events", width=80, box=box.ROUNDED, style="green", title_style="bold green")
-
-        table.add_column("Time", justify="center", style="yellow", header_style="bold yellow")
-        table.add_column("Sensor", justify="center", style="cyan", header_style="bold cyan")
-        table.add_column("Data", justify="center", style="white", header_style="bold white")
-
-        for data in data_history:
-            data_str = f"Temperature: {data['data']['temperature']} \u00B0C, Humidity: {data['data']['humidity']} %, Pressure: {data['data']['pressure']} hPa, RSSI: {data['data']['rssi']} dBm, Battery: {(data['data']['battery']) / 1000} V"
-            table.add_row(Text(datetime.strptime(data['timestamp'], "%Y-%m-%dT%H:%M:%SZ").strftime("%Y-%m-%d %H:%M:%S")), Text(data['mac']), Text(data_str))
-
-        print(table)
+        ui_recent_events(data_history)
+        ui_sink_problems(fan_out.dropped, fan_out.errors)
 
         # List of commands
         commands_strings = ["Stop broadcasting"]
@@ -248,6 +1061,216 @@ def broadcasting_screen():
         # Handle commands
         ui_commands(commands_strings, commands)
 
+#-----------------------------------------------------------------------------#
+# broadcasting_async_screen - Broadcasting Screen (asyncio engine)            #
+#-----------------------------------------------------------------------------#
+def broadcasting_async_screen():
+    global settings, SETTINGS_PATH, rules
+
+    if aiohttp is None:
+        print("[bold red]asyncio engine requires aiohttp. Please install it with pip.")
+        exit(1)
+
+    if not settings['broadcasting']:
+        settings['broadcasting'] = True
+
+        try:
+            with open(SETTINGS_PATH, 'w') as f:
+                json.dump(settings, f, indent=4)
+        except IOError:
+            print(f"[bold red]{SETTINGS_PATH}: Could not write file. Please check if you have write permissions.")
+            exit(1)
+
+    # Local sinks (file and MQTT) may block, so they are created here and fed
+    # through a FanOut. Firebase uploads go through the loop's upload queue.
+    fan_out = FanOut([sink for sink in create_sinks() if sink.name != 'firebase'])
+
+    # The screen is drawn in a single thread, so it never blocks the loop
+    render_executor = ThreadPoolExecutor(max_workers=1)
+
+    # broadcast - Runs the broadcasting tasks until stopped -------------------
+    async def broadcast():
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        data_history = []
+        rule_engine = RuleEngine(rules)
+        sampler = create_sampler()
+        upload_queue = asyncio.Queue(maxsize=SINK_QUEUE_SIZE)
+        token_lock = asyncio.Lock()
+        ingest_error = None
+        dropped = {'firebase': 0}
+        errors = {'firebase': 0}
+
+        # draw - Draws the screen (in the render thread) ----------------------
+        def draw(data_history: list, dropped: dict, errors: dict):
+            subprocess.call(['tput', 'reset'])
+            # console.clear()
+            ui_title("Broadcasting...")
+            console.print()
+
+            # Print table
+            ui_recent_events(data_history)
+            ui_sink_problems(dropped, errors)
+
+            # List of commands
+            commands_strings = ["Stop broadcasting"]
+
+            # Print each command with its index number
+            for i, command in enumerate(commands_strings, 1):
+                console.print(f"{i}. {command}")
+
+            console.print()
+            print("Enter command: ", end="", flush=True)
+        #----------------------------------------------------------------------
+
+        # render - Hands a snapshot of the screen to the render thread --------
+        def render():
+            loop.run_in_executor(
+                render_executor, draw,
+                list(data_history),
+                {**fan_out.dropped, **dropped},
+                {**fan_out.errors, **errors}
+            )
+        #----------------------------------------------------------------------
+
+        # publish - Sends an item to the local sinks and queues the upload ----
+        def publish(kind: str, payload: dict):
+            fan_out.publish(kind, payload)
+
+            if 'firebase' in settings['sinks']:
+                try:
+                    upload_queue.put_nowait((kind, payload))
+                except asyncio.QueueFull:
+                    # Uploads are too slow, so drop the item
+                    if dropped['firebase'] == 0:
+                        logging.error("firebase: Upload queue is full, dropping items")
+                    dropped['firebase'] += 1
+        #----------------------------------------------------------------------
+
+        # ingest - Receives the Ruuvi data ------------------------------------
+        async def ingest():
+            async for mac_address, sensor_data in RuuviTagSensor.get_data_async(settings['followed_sensors']):
+                if sensor_data['data_format'] < 5:
+                    continue
+
+                if process_reading(mac_address, sensor_data, time.time(), rule_engine, sampler, data_history, publish):
+                    render()
+        #----------------------------------------------------------------------
+
+        # upload_worker - Uploads the queued items to Firebase ----------------
+        async def upload_worker(session):
+            while True:
+                kind, payload = await upload_queue.get()
+
+                try:
+                    await firebase_upload(session, kind, payload, refresh_token)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    errors['firebase'] += 1
+                    logging.error(f"firebase: Could not upload {kind}: {e!r}")
+                finally:
+                    upload_queue.task_done()
+        #----------------------------------------------------------------------
+
+        # refresh_token - Refreshes the user's token once at a time -----------
+        async def refresh_token(session):
+            id_token = settings['id_token']
+
+            async with token_lock:
+                # Another task has refreshed the token while waiting
+                if settings['id_token'] != id_token:
+                    return
+
+                try:
+                    await refresh_user_token_async(session)
+                except (aiohttp.ClientError, asyncio.TimeoutError, KeyError) as e:
+                    print("Error refreshing token: ", e)
+
+                try:
+                    with open(SETTINGS_PATH, 'w') as f:
+                        json.dump(settings, f, indent=4)
+                except IOError:
+                    print(f"[bold red]{SETTINGS_PATH}: Could not create or write file")
+                    exit()
+        #----------------------------------------------------------------------
+
+        # token_timer - Refreshes the user's token before it expires ----------
+        async def token_timer(session):
+            while True:
+                if (settings['token_expiration_time'] - int(time.time())) <= TOKEN_UPDATE_DURATION:
+                    await refresh_token(session)
+
+                await asyncio.sleep(TOKEN_CHECK_INTERVAL)
+        #----------------------------------------------------------------------
+
+        # handle_input - Handles the commands without blocking the loop -------
+        def handle_input():
+            command = sys.stdin.readline().strip()
+
+            if command == "1":
+                stop.set()
+            else:
+                render()
+        #----------------------------------------------------------------------
+
+        loop.add_reader(sys.stdin, handle_input)
+        render()
+
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+            tasks = [
+                asyncio.create_task(ingest()),
+                asyncio.create_task(token_timer(session))
+            ]
+            workers = [asyncio.create_task(upload_worker(session)) for _ in range(settings['max_inflight'])]
+            stop_task = asyncio.create_task(stop.wait())
+
+            # Run until stopped or the ingestion ends
+            await asyncio.wait([stop_task, tasks[0]], return_when=asyncio.FIRST_COMPLETED)
+            loop.remove_reader(sys.stdin)
+
+            # Did the ingestion fail?
+            if tasks[0].done() and not tasks[0].cancelled():
+                ingest_error = tasks[0].exception()
+
+            # Cancel the ingestion and the timers
+            for task in tasks + [stop_task]:
+                task.cancel()
+
+            await asyncio.gather(*tasks, stop_task, return_exceptions=True)
+
+            # Deliver the queued uploads before leaving
+            try:
+                await asyncio.wait_for(upload_queue.join(), 10)
+            except asyncio.TimeoutError:
+                pass
+
+            for worker in workers:
+                worker.cancel()
+
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        return ingest_error
+    #--------------------------------------------------------------------------
+
+    ingest_error = asyncio.run(broadcast())
+
+    # Deliver the queued items of the local sinks and finish drawing
+    fan_out.close(timeout=10)
+    render_executor.shutdown(wait=True)
+
+    # Save settings and go back to the Main Screen
+    settings['broadcasting'] = False
+
+    try:
+        with open(SETTINGS_PATH, 'w') as f:
+            json.dump(settings, f, indent=4)
+    except IOError:
+        print(f"[bold red]{SETTINGS_PATH}: Could not write file. Please check if you have write permissions.")
+        exit(1)
+
+    if ingest_error is not None:
+        print(f"[bold red]Error receiving Ruuvi data: {escape(repr(ingest_error))}")
+        exit(1)
+
 #-----------------------------------------------------------------------------#
 # scanning_screen - Scanning Screen                                           #
 #-----------------------------------------------------------------------------#
@@ -257,6 +1280,8 @@ def scanning_screen():
     run_flag.running = True     # Scanning flag
     ui_update = True            # Should the screen to be updated?
     new_discoveries = []
+    scan_loop = None            # Scanning event loop (asyncio engine)
+    scan_task = None            # Scanning task (asyncio engine)
 
     # back - Go back to Main Screen -------------------------------------------
     def back():
@@ -264,6 +1289,14 @@ def scanning_screen():
         nonlocal finished
         run_flag.running = False
         finished = True
+
+        # Cancel the scanning task instead of the RunFlag (asyncio engine)
+        if scan_loop is not None:
+            try:
+                scan_loop.call_soon_threadsafe(scan_task.cancel)
+            except RuntimeError:
+                # The loop has already been closed
+                pass
     #--------------------------------------------------------------------------
 
     # scan_sensors - Callback function for the Ruuvi get_data -----------------
@@ -306,9 +1339,36 @@ def scanning_screen():
             ui_update = False
     #--------------------------------------------------------------------------
 
+    # scan_sensors_async - Scans Ruuvi-sensors asynchronously ----------------
+    async def scan_sensors_async():
+        async for found_data in RuuviTagSensor.get_data_async():
+            scan_sensors(found_data)
+    #--------------------------------------------------------------------------
+
     # scan_sensors_thread - Thread for scanning Ruuvi-sensors -----------------
     def scan_sensors_thread():
-        RuuviTagSensor.get_data(scan_sensors, None, run_flag)
+        nonlocal scan_loop, scan_task
+
+        # NOTE: The Bleak adapter of the asyncio engine supports only the
+        # asynchronous data retrieval.
+        if ASYNCIO_ENGINE:
+            loop = asyncio.new_event_loop()
+            scan_task = loop.create_task(scan_sensors_async())
+            scan_loop = loop
+
+            # Stopped before the task was created?
+            if finished:
+                scan_task.cancel()
+
+            try:
+                loop.run_until_complete(scan_task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.close()
+        else:
+            RuuviTagSensor.get_data(scan_sensors, None, run_flag)
     #--------------------------------------------------------------------------
 
     # Create a thread for scanning Ruuvi-sensors
@@ -509,7 +1569,16 @@ def settings_screen():
         else:
             time_interval_column = Columns([Text("Time Interval:", style="bold blue"), Text(str(settings['time_interval']) + " minutes", style="white")])
 
-        rows = Group(device_uuid_column, time_interval_column)
+        sinks_column = Columns([Text("Output Sinks:", style="bold blue"), Text(", ".join(settings['sinks']) if settings['sinks'] else "None", style="white")])
+
+        if settings['adaptive_sampling']:
+            adaptive_sampling_text = f"{settings['adaptive_min_interval']}-{settings['adaptive_max_interval']} minutes, max {settings['upload_budget']} uploads / hour"
+        else:
+            adaptive_sampling_text = "Off"
+
+        adaptive_sampling_column = Columns([Text("Adaptive Sampling:", style="bold blue"), Text(adaptive_sampling_text, style="white")])
+
+        rows = Group(device_uuid_column, time_interval_column, sinks_column, adaptive_sampling_column)
 
         # prompt_uuid - Device UUID Prompt ------------------------------------
         def prompt_uuid():
@@ -549,6 +1618,75 @@ def settings_screen():
                 settings['time_interval'] = time_interval
         #----------------------------------------------------------------------
 
+        # prompt_adaptive_sampling - Adaptive Sampling Prompt -----------------
+        def prompt_adaptive_sampling():
+            nonlocal rows
+            subprocess.call(['tput', 'reset'])
+            # console.clear()
+            ui_title("Settings")
+
+            # Print device information
+            console.print(Panel(rows, title="[bold green]Device Settings", style="green", width=80))
+
+            # Handle input
+            if not Confirm.ask("Enable adaptive sampling?", default=settings['adaptive_sampling']):
+                settings['adaptive_sampling'] = False
+                return
+
+            min_interval = IntPrompt.ask("Enter minimum time interval in minutes (Enter 0 to Cancel)", default=settings['adaptive_min_interval'])
+
+            if min_interval <= 0:
+                return
+
+            max_interval = IntPrompt.ask("Enter maximum time interval in minutes (Enter 0 to Cancel)", default=max(settings['adaptive_max_interval'], min_interval))
+
+            if max_interval <= 0:
+                return
+            elif max_interval < min_interval:
+                max_interval = min_interval
+
+            upload_budget = IntPrompt.ask("Enter maximum uploads per hour of all sensors (Enter 0 to Cancel)", default=settings['upload_budget'])
+
+            if upload_budget <= 0:
+                return
+
+            settings['adaptive_sampling'] = True
+            settings['adaptive_min_interval'] = min_interval
+            settings['adaptive_max_interval'] = max_interval
+            settings['upload_budget'] = upload_budget
+        #----------------------------------------------------------------------
+
+        # prompt_sinks - Output Sinks Prompt ----------------------------------
+        def prompt_sinks():
+            nonlocal rows
+            subprocess.call(['tput', 'reset'])
+            # console.clear()
+            ui_title("Settings")
+
+            # Print device information
+            console.print(Panel(rows, title="[bold green]Device Settings", style="green", width=80))
+
+            # Print the sinks with their index number
+            for i, sink_name in enumerate(SINK_NAMES, 1):
+                state = "enabled" if sink_name in settings['sinks'] else "disabled"
+                console.print(f"{i}. [white]{sink_name} ({state})")
+
+            console.print()
+
+            # Handle input
+            sink_number = IntPrompt.ask("Enter sink number to enable / disable (Enter 0 to Cancel)")
+
+            if sink_number <= 0 or sink_number > len(SINK_NAMES):
+                return
+
+            sink_name = SINK_NAMES[sink_number - 1]
+
+            if sink_name in settings['sinks']:
+                settings['sinks'].remove(sink_name)
+            else:
+                settings['sinks'].append(sink_name)
+        #----------------------------------------------------------------------
+
         subprocess.call(['tput', 'reset'])
         # console.clear()
         ui_title("Settings")
@@ -557,8 +1695,111 @@ def settings_screen():
         console.print(Panel(rows, title="[bold green]Device Settings", style="green", width=80))
         
         # List of commands
-        commands_strings = ["Generate new Device UUID", "Time Interval", "Back"]
-        commands = [prompt_uuid, prompt_time_interval, back]
+        commands_strings = ["Generate new Device UUID", "Time Interval", "Adaptive Sampling", "Output Sinks", "Back"]
+        commands = [prompt_uuid, prompt_time_interval, prompt_adaptive_sampling, prompt_sinks, back]
+
+        # Handle commands
+        ui_commands(commands_strings, commands)
+
+#-----------------------------------------------------------------------------#
+# export_screen - Export Readings screen                                      #
+#-----------------------------------------------------------------------------#
+def export_screen():
+    global READINGS_PATH
+    finished = False
+    last_export = Text("None", style="bold white")
+
+    # export - Prompts the filters and exports the readings -------------------
+    def export():
+        nonlocal last_export
+
+        # The rotated (older) file first, then the current file
+        readings_paths = [path for path in [READINGS_PATH + ".1", READINGS_PATH] if os.path.isfile(path)]
+
+        if not readings_paths:
+            last_export = Text(f"{READINGS_PATH}: File does not exist.", style="bold red")
+            return
+
+        # Filters
+        macs_string = Prompt.ask("Enter MAC addresses separated by commas (Empty for all)", default="", show_default=False)
+        start_string = Prompt.ask("Enter start time in UTC as YYYY-MM-DD HH:MM (Empty for no limit)", default="", show_default=False)
+        end_string = Prompt.ask("Enter end time in UTC as YYYY-MM-DD HH:MM (Empty for no limit)", default="", show_default=False)
+
+        macs = [mac.strip().upper() for mac in macs_string.split(",") if mac.strip()]
+
+        try:
+            start = datetime.strptime(start_string, "%Y-%m-%d %H:%M").strftime("%Y-%m-%dT%H:%M:00Z") if start_string else None
+            end = datetime.strptime(end_string, "%Y-%m-%d %H:%M").strftime("%Y-%m-%dT%H:%M:59Z") if end_string else None
+        except ValueError:
+            last_export = Text("Invalid time format. Use YYYY-MM-DD HH:MM.", style="bold red")
+            return
+
+        # Output
+        export_format = Prompt.ask("Enter export format", choices=["csv", "parquet"], default="csv")
+
+        if export_format == "parquet" and pyarrow is None:
+            last_export = Text("Parquet export requires pyarrow. Please install it with pip.", style="bold red")
+            return
+
+        compress = Confirm.ask("Compress the output?", default=False)
+
+        if export_format == "csv":
+            default_path = datetime.now().strftime("readings_%Y%m%d_%H%M%S.csv") + (".gz" if compress else "")
+        else:
+            default_path = datetime.now().strftime("readings_%Y%m%d_%H%M%S.parquet")
+
+        path = Prompt.ask("Enter output file", default=default_path)
+
+        readings = read_readings(readings_paths, macs, start, end)
+
+        # pyarrow raises its own exceptions e.g. on schema mismatches
+        export_errors = (IOError, ValueError, TypeError, KeyError)
+        if pyarrow is not None:
+            export_errors += (pyarrow.lib.ArrowException,)
+
+        # Export to a temporary file, which replaces the output file only
+        # when the export has succeeded
+        part_path = path + ".part"
+
+        try:
+            if export_format == "csv":
+                count = export_csv(readings, part_path, compress)
+            else:
+                count = export_parquet(readings, part_path, compress)
+
+            os.replace(part_path, path)
+        except export_errors as e:
+            # Do not leave a partial file behind
+            if os.path.isfile(part_path):
+                os.remove(part_path)
+
+            if isinstance(e, IOError):
+                last_export = Text(f"{path}: Could not write file. Please check if you have write permissions.", style="bold red")
+            else:
+                last_export = Text(f"Could not export readings: {e}", style="bold red")
+            return
+
+        last_export = Text(f"Exported {count} readings to {path}", style="bold white")
+    #--------------------------------------------------------------------------
+
+    # back - Go back to Main Screen -------------------------------------------
+    def back():
+        nonlocal finished
+        finished = True
+    #--------------------------------------------------------------------------
+
+    # Render loop...
+    while not finished:
+        subprocess.call(['tput', 'reset'])
+        # console.clear()
+        ui_title("Export Readings")
+
+        # Print the result of the last export
+        console.print(Panel(last_export, title="[bold green]Last Export", style="green", width=80))
+
+        # List of commands
+        commands_strings = ["Export", "Back"]
+        commands = [export, back]
 
         # Handle commands
         ui_commands(commands_strings, commands)
@@ -570,8 +1811,14 @@ def main_screen():
     global settings
     login = True
 
+    # Select the broadcasting engine
+    if ASYNCIO_ENGINE:
+        broadcasting = broadcasting_async_screen
+    else:
+        broadcasting = broadcasting_screen
+
     if (settings['broadcasting'] == True):
-        broadcasting_screen()
+        broadcasting()
 
     # log_out - Logs out the user ---------------------------------------------
     def log_out():
@@ -622,8 +1869,8 @@ def main_screen():
             console.print(Panel(followed_text, title="[bold green]Followed Sensors", style="green", width=80))
 
         # List of commands
-        commands_strings = ["Start broadcasting", "Sensors", "Settings", "Log out", "Quit"]
-        commands = [broadcasting_screen, sensors_screen, settings_screen, log_out, exit]
+        commands_strings = ["Start broadcasting", "Sensors", "Settings", "Export readings", "Log out", "Quit"]
+        commands = [broadcasting, sensors_screen, settings_screen, export_screen, log_out, exit]
 
         # Handle commands
         ui_commands(commands_strings, commands)
@@ -671,7 +1918,7 @@ def login_screen():
 #                                    MAIN                                     #
 #-----------------------------------------------------------------------------#
 def main():
-    global SETTINGS_PATH, FIREBASE_CONF_PATH, settings, firebaseConfig, firebase, auth, db
+    global SETTINGS_PATH, FIREBASE_CONF_PATH, RULES_PATH, settings, firebaseConfig, firebase, auth, db, rules
 
     # Load settings...
 
@@ -711,6 +1958,33 @@ def main():
             print(f"[bold red]{SETTINGS_PATH}: Could not write file. Please check if you have write permissions.")
             exit(1)
 
+    # Add the settings that are missing from older settings-files
+    settings.setdefault('sinks', ['firebase', 'readings_file'])
+    settings.setdefault('mqtt_host', 'localhost')
+    settings.setdefault('mqtt_port', 1883)
+    settings.setdefault('mqtt_topic', 'isolinna')
+    settings.setdefault('line_protocol_path', 'readings.lp')
+    settings.setdefault('max_inflight', 8)
+    settings.setdefault('adaptive_sampling', False)
+    settings.setdefault('adaptive_min_interval', 1)
+    settings.setdefault('adaptive_max_interval', 15)
+    settings.setdefault('upload_budget', 600)
+
+    # Validate the adaptive sampling settings (the sampler divides by them)
+    for key in ['adaptive_min_interval', 'adaptive_max_interval', 'upload_budget']:
+        if not isinstance(settings[key], (int, float)) or isinstance(settings[key], bool) or settings[key] <= 0:
+            print(f"[bold red]{SETTINGS_PATH}: '{key}' must be a positive number.")
+            exit(1)
+
+    if settings['adaptive_max_interval'] < settings['adaptive_min_interval']:
+        print(f"[bold red]{SETTINGS_PATH}: 'adaptive_max_interval' must not be less than 'adaptive_min_interval'.")
+        exit(1)
+
+    # Validate the number of upload workers of the asyncio engine
+    if not isinstance(settings['max_inflight'], int) or isinstance(settings['max_inflight'], bool) or settings['max_inflight'] <= 0:
+        print(f"[bold red]{SETTINGS_PATH}: 'max_inflight' must be a positive integer.")
+        exit(1)
+
     # Load Firebase configuration...
 
     # Does configuration-file exists?
@@ -738,6 +2012,33 @@ def main():
         print(f"[bold red]{FIREBASE_CONF_PATH}: File does not exist.")
         exit(1)
 
+    # Load alert rules...
+
+    # Does rules-file exists? (Rules are optional)
+    if os.path.isfile(RULES_PATH):
+        # Yes...
+        # Read the rules from rules-file
+        try:
+            with open(RULES_PATH, 'r') as f:
+                rules = json.load(f)
+        except IOError:
+            print(f"[bold red]{RULES_PATH}: Could not open file. Please check the file's permissions.")
+            exit(1)
+        except json.JSONDecodeError:
+            print(f"[bold red]{RULES_PATH}: File contains invalid JSON.")
+            exit(1)
+
+        if not isinstance(rules, list):
+            print(f"[bold red]{RULES_PATH}: File must contain a list of rules.")
+            exit(1)
+
+        for rule in rules:
+            error = validate_rule(rule)
+
+            if error is not None:
+                print(f"[bold red]{RULES_PATH}: {escape(error)}")
+                exit(1)
+
     # Setup Firebase...
 
     try:
@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    from isolinna import SlidingWindow
+except ImportError as e:
+    raise unittest.SkipTest(f"isolinna dependencies are not installed: {e}")
+
+
+class SlidingWindowTest(unittest.TestCase):
+    def test_duplicate_samples_expire(self):
+        window = SlidingWindow(1)
+        window.add(0, 5)
+        window.add(0, 5)
+        window.add(5, 1)
+
+        self.assertEqual(window.aggregate('min'), 1)
+        self.assertEqual(window.aggregate('max'), 1)
+        self.assertEqual(window.aggregate('avg'), 1)
+
+    def test_duplicate_samples_expire_one_by_one(self):
+        window = SlidingWindow(10)
+        window.add(0, 5)
+        window.add(0, 5)
+        window.add(5, 7)
+
+        self.assertEqual(window.aggregate('min'), 5)
+        self.assertEqual(window.aggregate('max'), 7)
+
+        window.add(10, 6)
+
+        self.assertEqual(window.aggregate('min'), 6)
+        self.assertEqual(window.aggregate('max'), 7)
+        self.assertEqual(window.aggregate('last'), 6)
+
+    def test_aggregates_match_samples_in_window(self):
+        window = SlidingWindow(3)
+        samples = [(0, 4), (1, 2), (1, 2), (2, 9), (3, 1), (3, 1), (5, 3), (6, 3)]
+
+        for i, (t, value) in enumerate(samples):
+            window.add(t, value)
+            values = [v for (st, v) in samples[:i + 1] if st > t - 3]
+
+            self.assertEqual(window.aggregate('min'), min(values))
+            self.assertEqual(window.aggregate('max'), max(values))
+            self.assertAlmostEqual(window.aggregate('avg'), sum(values) / len(values))
+
+
+if __name__ == '__main__':
+    unittest.main()